@@ -2,6 +2,60 @@ import numpy as np
 import time
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, fall back to plain numpy
+    njit = None
+
+
+def _quantum_update_loop(mu, sigma, best, bob, mu_scaler, sigma_scaler,
+                         boost):
+    """Updates mu and sigma in place with a single pass over the
+    features. Meant to be compiled with numba."""
+
+    for k in range(mu.shape[0]):
+        mu_delta = best[k] - mu[k]
+        sigma_decider = abs(mu_delta) / sigma[k]
+        mu[k] = mu[k] + (mu_delta + bob[k] - mu[k]) / mu_scaler
+
+        if sigma_decider < 1:
+            updated_sigma = sigma[k] / sigma_scaler
+            if boost and updated_sigma < 0.001:
+                updated_sigma = updated_sigma * sigma_scaler
+        else:
+            updated_sigma = sigma[k] * sigma_scaler
+        sigma[k] = updated_sigma
+
+
+def _quantum_update_numpy(mu, sigma, best, bob, mu_scaler, sigma_scaler,
+                          boost):
+    """Vectorized equivalent of _quantum_update_loop, used when numba
+    is not available."""
+
+    mu_delta = best - mu
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma_decider = np.abs(mu_delta) / sigma
+
+    shrink = sigma_decider < 1
+    updated_sigma = np.where(shrink, sigma / sigma_scaler,
+                             sigma * sigma_scaler)
+    if boost:
+        condition = (updated_sigma < 0.001) & shrink
+        updated_sigma[condition] *= sigma_scaler
+
+    mu += (mu_delta + bob - mu) / mu_scaler
+    sigma[:] = updated_sigma
+
+
+if njit is not None:
+    # numpy error model: a pinned feature (sigma == 0) gives inf/nan
+    # instead of raising ZeroDivisionError, as in the numpy fallback
+    _quantum_update_kernel = njit(cache=True,
+                                  error_model='numpy')(_quantum_update_loop)
+else:
+    _quantum_update_kernel = _quantum_update_numpy
 
 
 class QuantumEvAlgorithm:
@@ -11,12 +65,35 @@ class QuantumEvAlgorithm:
 
     def __init__(self, f, n_dims, upper_bound, lower_bound, integral_id,
                  sigma_scaler=1.00001, mu_scaler=100, elitist_level=4,
-                 ros_flag=False, saving_interval=1, restrictions=[]):
+                 ros_flag=False, saving_interval=1, restrictions=[],
+                 seed=None, n_workers=1, history_dtype=np.float32,
+                 batch_generations=1, vectorized=None):
 
         """The QuantumEvAlgorithm class admits a (scalar) function to be
         optimized. The function must be able to generate multiple outputs
         for multiple inputs of shape (n_samples,n_dimensions).The n_dims
-        attribute is to be placed as an input of the class"""
+        attribute is to be placed as an input of the class.
+        Functions that only accept a single point can be used with
+        vectorized=False; they are then called once per sample. By
+        default (vectorized=None) this is detected with a probe call.
+        The seed is handed to np.random.default_rng so that runs
+        can be reproduced.
+
+        With n_workers > 1 the samples of every iteration are split
+        among a pool of n_workers processes for their evaluation. In
+        that case f must be picklable (e.g. defined at module level).
+        The pool lives for the duration of training(), or of a with
+        block over the optimizer to share it across several calls.
+
+        The saved history of mu and sigma is stored with history_dtype.
+
+        The standard normal noise behind the samples is drawn for
+        batch_generations populations at once, which amortizes the cost
+        of the generator calls when the populations are small.
+
+        The progress bar of training() is only drawn when stdout is a
+        terminal. Jupyter's stdout reports isatty() == False, so no bar
+        is shown in notebooks."""
 
         self.cost_function = f
         self.n_dims = n_dims
@@ -25,10 +102,35 @@ class QuantumEvAlgorithm:
         self.elitist_level = elitist_level
         self.ros_flag = ros_flag
         self.saving_interval = saving_interval
-        self.upper = upper_bound
-        self.lower = lower_bound
+        self.history_dtype = history_dtype
+        # Stored as float so that clipping the samples against them
+        # needs no casting
+        self.upper = np.asarray(upper_bound, dtype=float)
+        self.lower = np.asarray(lower_bound, dtype=float)
         self.integral_id = integral_id
+        self._integral_cols = np.flatnonzero(integral_id)
         self.restrictions = restrictions
+        self.n_workers = n_workers
+        self.batch_generations = batch_generations
+
+        self._pool = None
+
+        self.rng = np.random.default_rng(seed)
+        # Reused by quantum_sampling, grown on demand. Kept in C order:
+        # the cost functions reduce along the features of each sample
+        # and the noise block is consumed by rows
+        self._sample_buf = np.empty((0, n_dims))
+        # Block of pre-drawn standard normal noise, consumed from
+        # _noise_pos up to _noise_end
+        self._noise = np.empty((0, n_dims))
+        self._noise_pos = 0
+        self._noise_end = 0
+        # Running estimate of the fraction of samples that satisfy
+        # the restrictions, used to size restricted_quantum_sampling draws
+        self._acceptance_rate = 1.0
+
+        self._bar_len = 30
+        self._bar_template = '|' * self._bar_len + '_' * self._bar_len
 
         assert (np.array(n_dims) == self.lower.shape and
                 np.array(n_dims) == self.upper.shape), f"The dimensions\
@@ -36,87 +138,208 @@ of upper and lower bounds do not coincide with the dimensionality\
 of the problem. n_dims = {self.n_dims} vs lower bound =\
 {self.lower.shape} and upper_bound = {self.upper.shape} "
 
+        assert batch_generations >= 1, f"batch_generations must be at\
+ least 1, got {batch_generations}"
+
+        if vectorized is None:
+            # Any number of rows other than n_dims tells apart a function
+            # that treats the probe as a single point
+            n_probe = 3 if n_dims == 2 else 2
+            probe = np.tile((self.lower + self.upper) / 2, (n_probe, 1))
+            try:
+                vectorized = np.size(f(probe)) == n_probe
+            except (TypeError, ValueError, IndexError):
+                # A function that can't take a batch at all
+                vectorized = False
+        self._scalar_cf = not vectorized
+
     def quantum_individual_init(self):
 
         """Creates a Quantum individual of n_dims features. For each
-        feature mu and sigma are created (normal distribution).
+        feature mu and sigma are created (normal distribution). They
+        are kept as two separate 1-D arrays:
+
+        self.mu: mean
+        self.sigma: std deviation
+
+        In this case, mu is drawn uniformly within the bounds. The
+        initialization of the std deviation is done so that a
+        significant part of the domain is covered."""
+
+        self.mu = self.rng.uniform(self.lower, self.upper, size=self.n_dims)
+        self.sigma = (self.upper - self.lower).astype(float)
 
-        First row: mean (mu)
-        Second row: std deviation (sigma)
+        # A copy, as mu is updated in place
+        self.best_of_best = self.mu.copy()
+        # Replaced by the first best performer, no evaluation needed
+        self.best_of_best_cost = np.inf
 
-        In this case, the mu creation is random. The initialization
-        of the std deviation is done so that a significant part of
-        the domain is covered."""
+    def _standard_normal(self, n_samples):
+        """Returns n_samples rows of standard normal noise, drawing a
+        new block of batch_generations * n_samples rows when the
+        current one runs out."""
 
-        Q = self.lower + self.upper * np.random.rand(2, self.n_dims)
-        Q[1, :] = (self.upper - self.lower) * np.ones(self.n_dims)
+        if self._noise_end - self._noise_pos < n_samples:
+            rows = n_samples * self.batch_generations
+            if self._noise.shape[0] < rows:
+                self._noise = np.empty((rows, self.n_dims))
+            self.rng.standard_normal(out=self._noise[:rows])
+            self._noise_pos = 0
+            self._noise_end = rows
 
-        self.best_of_best = Q[0:1, :]  # Initial definition of best_of_best
-        return Q
+        start = self._noise_pos
+        self._noise_pos += n_samples
 
-    def quantum_sampling(self, Q, n_samples):
+        return self._noise[start:self._noise_pos]
 
-        """This method generates n_samples from Q
+    def quantum_sampling(self, n_samples):
+
+        """This method generates n_samples from the Quantum individual
         (each sample feature is generated with its correspondent
-        mu_i and sigma_i)"""
+        mu_i and sigma_i).
 
-        if self.integral_id.any():
-            normal_samples = np.random.normal(Q[0, :], Q[1, :],
-                                              size=(n_samples, self.n_dims))
+        The samples are written into a buffer owned by the object,
+        so the returned array is overwritten by the next call."""
 
-            mask = np.tile(self.integral_id, (n_samples, 1))
-            samples = np.minimum(np.maximum(normal_samples, self.lower),
-                                 self.upper)
+        if self._sample_buf.shape[0] < n_samples:
+            self._sample_buf = np.empty((n_samples, self.n_dims))
+        samples = self._sample_buf[:n_samples]
 
-            np.place(samples, mask, np.round(samples[mask]))
+        np.multiply(self._standard_normal(n_samples), self.sigma, out=samples)
+        samples += self.mu
+        np.clip(samples, self.lower, self.upper, out=samples)
 
-        else:
-            samples = np.minimum(np.maximum(np.random.normal(Q[0, :],
-                                                             Q[1, :],
-                                                             size=(n_samples,
-                                                             self.n_dims)),
-                                            self.lower),
-                                 self.upper)
+        if self._integral_cols.size:
+            # Gather the integral columns once, round them in place
+            # and scatter them back
+            integral_samples = samples[:, self._integral_cols]
+            np.rint(integral_samples, out=integral_samples)
+            samples[:, self._integral_cols] = integral_samples
 
         return samples
 
-    def restricted_quantum_sampling(self, Q, n_samples):
-        """This method generates n_samples from Q (each sample
-        feature is generated with its correspondent mu_i and sigma_i)"""
+    def valid_samples(self, samples):
+        """Boolean mask of the samples that satisfy every
+        restriction (h(x) >= 0)."""
 
-        samples = self.quantum_sampling(Q, n_samples)
+        valid = np.ones(samples.shape[0], dtype=bool)
+        for h in self.restrictions:
+            valid &= h(samples) >= 0
 
-        valid = np.full(n_samples, True)
+        return valid
 
-        for h in self.restrictions:
-            valid = valid * h(samples) >= 0
-        samples = samples[valid, :]
+    def restricted_quantum_sampling(self, n_samples):
+        """This method generates n_samples from the Quantum individual
+        (each sample feature is generated with its correspondent
+        mu_i and sigma_i) that satisfy the restrictions. Each draw is
+        oversampled by the inverse of the estimated acceptance rate so
+        that the rejection loop usually runs only once."""
+
+        rate = self._acceptance_rate
+        samples = np.empty((n_samples, self.n_dims))
+        filled = 0
+
+        while (n_samples - filled > 0):
+            missing = n_samples - filled
+            n_draw = int(np.ceil(missing / max(rate, 0.01)))
+            new_samples = self.quantum_sampling(n_draw)
 
-        while (n_samples-samples.shape[0] > 0):
-            new_samples = self.quantum_sampling(Q, n_samples
-                                                - samples.shape[0])
+            valid = self.valid_samples(new_samples)
+            rate = 0.5 * rate + 0.5 * valid.mean()
 
-            valid_s = np.full(n_samples - samples.shape[0], True)
-            for h in self.restrictions:
-                valid_s = valid_s * h(new_samples) > 0
-            samples = np.vstack((samples, new_samples[valid_s, :]))
+            # Copy the accepted rows straight into their final place
+            accepted = np.flatnonzero(valid)[:missing]
+            np.take(new_samples, accepted, axis=0,
+                    out=samples[filled:filled + accepted.size])
+            filled += accepted.size
+
+        self._acceptance_rate = rate
 
         return samples
 
-    def elitist_sample_evaluation(self, samples):
+    def evaluate(self, samples):
+        """Evaluates the cost function over the samples, dividing them
+        among the worker processes if there is a pool."""
 
-        """Selection of the n best samples to compute
-        the mean."""
+        n_samples = samples.shape[0]
+        if self._scalar_cf:
+            if self._pool is None:
+                costs = map(self.cost_function, samples)
+            else:
+                chunksize = -(-n_samples // self.n_workers)
+                costs = self._pool.map(self.cost_function, samples,
+                                       chunksize=chunksize)
+            # Single point functions may return size-1 arrays
+            return np.fromiter((np.asarray(c).item() for c in costs),
+                               dtype=float, count=n_samples)
+
+        if self._pool is None:
+            return self.cost_function(samples)
+
+        # No empty chunks when there are fewer samples than workers
+        chunks = np.array_split(samples, min(self.n_workers, n_samples))
+        return np.concatenate(list(self._pool.map(self.cost_function,
+                                                  chunks)))
+
+    def point_cost(self, x):
+        """Cost of a single 1-D point. Vectorized cost functions get it
+        as a (1, n_dims) batch, as documented for f."""
+
+        if not self._scalar_cf:
+            x = x[None]
+
+        return np.asarray(self.cost_function(x)).item()
+
+    def open(self):
+        """Starts the worker processes if n_workers > 1 and they are
+        not running yet. Returns whether a pool was started."""
+
+        if self.n_workers > 1 and self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.n_workers)
+            return True
+
+        return False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shuts down the worker processes, if any."""
 
-        cost = self.cost_function(samples)
-        sort_order = np.argsort(cost, axis=0)
-        elitist_level = self.elitist_level
-        best_performing_sample = np.mean(samples[sort_order[0:elitist_level]],
-                                         axis=0)[None]
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
 
-        return best_performing_sample
+    def elitist_sample_evaluation(self, samples, elitist_level=None):
 
-    def quantum_update(self, Q, best_performing_sample):
+        """Selection of the n best samples to compute
+        the mean (n = elitist_level, self.elitist_level by default).
+        Returns the mean, its cost and the cost of every sample, so
+        that callers do not need to evaluate them again."""
+
+        cost = self.evaluate(samples)
+        if elitist_level is None:
+            elitist_level = self.elitist_level
+        # Only the elitist_level best samples are needed, in no particular
+        # order, so a partition is enough (O(n) instead of O(n log n))
+        elite = np.argpartition(cost, elitist_level - 1,
+                                axis=0)[:elitist_level]
+
+        if elitist_level == 1:
+            # The best sample itself, whose cost is already known
+            best_performing_sample = samples[elite[0]].copy()
+            best_cost = np.asarray(cost[elite[0]]).item()
+        else:
+            best_performing_sample = samples[elite].mean(axis=0)
+            best_cost = self.point_cost(best_performing_sample)
+
+        return best_performing_sample, best_cost, cost
+
+    def quantum_update(self, best_performing_sample):
         """This method updates the Quantum individual with the
         criteria explained in the white paper. The update mainly
          depends in two hyper-parameters as defined below:
@@ -124,36 +347,26 @@ of the problem. n_dims = {self.n_dims} vs lower bound =\
         scaling: It controls the transformation of mu_(j+1)
         sigma_scaler: It controls the transformation of sigma_(j+1)."""
 
-        mu = Q[0:1, :]
-        sigma = Q[1:2, :]
-
         scaling = self.mu_scaler
-        mu_delta = best_performing_sample - mu
-        mu_delta_2 = self.best_of_best - mu
-
-        updated_mu = mu + (mu_delta + mu_delta_2) / scaling
-
-        sigma_decider = np.abs(mu_delta) / sigma
-
         sigma_scaler = self.sigma_scaler
 
-        updated_sigma = (sigma_decider < 1) * sigma / sigma_scaler +\
-                        (sigma_decider > 1) * sigma * sigma_scaler
-        if self.cost_function(updated_mu) > 10 and self.ros_flag:
-            condition = (updated_sigma < 0.001) * (sigma_decider < 1)
-            updated_sigma[condition] = updated_sigma[condition] * sigma_scaler
+        boost = False
+        if self.ros_flag:
+            mu = self.mu
+            updated_mu = mu + (best_performing_sample - mu
+                               + self.best_of_best - mu) / scaling
+            boost = self.point_cost(updated_mu) > 10
 
-        Q[0:1] = updated_mu
-        Q[1:2] = updated_sigma
-
-        return Q
+        _quantum_update_kernel(self.mu, self.sigma, best_performing_sample,
+                               self.best_of_best, scaling, sigma_scaler,
+                               boost)
 
     def progress(self, count, total, status='Processing'):
-        bar_len = 30
+        bar_len = self._bar_len
         filled_len = int(round(bar_len * count / float(total)))
 
         percents = round(100.0 * count / float(total), 1)
-        bar = '|' * filled_len + '_' * (bar_len - filled_len)
+        bar = self._bar_template[bar_len - filled_len:2 * bar_len - filled_len]
 
         sys.stdout.write('\r%s %s%s %s' % (bar, percents, '%', status))
         sys.stdout.flush()
@@ -165,61 +378,75 @@ of the problem. n_dims = {self.n_dims} vs lower bound =\
         must be greater than elitist level"
         j = 0
 
-        Q = self.quantum_individual_init()
+        self.quantum_individual_init()
 
-        Q_history = np.zeros((1 + int(N_iterations / self.saving_interval),
-                              2, self.n_dims))
+        # The history is only kept when it is going to be saved
+        if save:
+            Q_history = np.empty((1 + int(N_iterations
+                                          / self.saving_interval),
+                                  2, self.n_dims), dtype=self.history_dtype)
 
-        best_performer_marker = np.zeros((1+int(N_iterations
-                                         / self.saving_interval),
-                                         1))
+            best_performer_marker = np.zeros((1+int(N_iterations
+                                             / self.saving_interval),
+                                             1))
 
-        function_evaluations = np.zeros(1+int(N_iterations
-                                        / self.saving_interval))
+            function_evaluations = np.zeros(1+int(N_iterations
+                                            / self.saving_interval))
+
+        # The progress bar is only drawn on a terminal; when stdout is
+        # redirected it would just fill the log with carriage returns
+        interactive = sys.stdout.isatty()
 
         print('Beginning of the iteration process')
         beginning = time.time()
-        for i in range(N_iterations+1):
-            if self.restrictions:
-                samples = self.restricted_quantum_sampling(Q, sample_size)
-            else:
-                samples = self.quantum_sampling(Q, sample_size)
-                
-            if i > N_iterations - 1:
-                self.elitist_level = 1
+        # Only shut down a pool started here, not one from a with block
+        own_pool = self.open()
+        try:
+            for i in range(N_iterations+1):
+                if self.restrictions:
+                    samples = self.restricted_quantum_sampling(sample_size)
+                else:
+                    samples = self.quantum_sampling(sample_size)
+
+                # The last iteration keeps the best sample instead of the mean
+                elitist_level = (1 if i > N_iterations - 1
+                                 else self.elitist_level)
 
-            best_performer = self.elitist_sample_evaluation(samples)
+                best_performer, best_cost, _ = self.elitist_sample_evaluation(
+                    samples, elitist_level)
 
-            if self.cost_function(best_performer) <\
-               self.cost_function(self.best_of_best):
+                if best_cost < self.best_of_best_cost:
 
-                self.best_of_best = best_performer
+                    self.best_of_best = best_performer
+                    self.best_of_best_cost = best_cost
 
-            Q = self.quantum_update(Q, best_performer)
+                self.quantum_update(best_performer)
 
-            if np.mod(i, self.saving_interval) == 0:
-                Q_history[j, :, :] = Q
-                output = self.cost_function(best_performer)
-                best_performer_marker[j, :] = output
-                function_evaluations[j] = i * (sample_size)
-                j += 1
+                if save and np.mod(i, self.saving_interval) == 0:
+                    Q_history[j, 0, :] = self.mu
+                    Q_history[j, 1, :] = self.sigma
+                    best_performer_marker[j, :] = best_cost
+                    function_evaluations[j] = i * (sample_size)
+                    j += 1
 
-            if np.mod(i, 50) == 0:
+                if interactive and np.mod(i, 50) == 0:
 
-                self.progress(i, N_iterations,
-                              f'Best cost = \
-{self.cost_function(best_performer)}')
+                    self.progress(i, N_iterations,
+                                  f'Best cost = {best_cost}')
 
-            if self.cost_function(best_performer) <= 0.0001 and False:
-                print(f'\n\n|| Min detected,\
-                      value = {self.cost_function(best_performer)}||')
-                break
+                if best_cost <= 0.0001 and False:
+                    print(f'\n\n|| Min detected,\
+                          value = {best_cost}||')
+                    break
+        finally:
+            if own_pool:
+                self.close()
 
         end = time.time()
 
         results = {
             "time": end - beginning,
-            "cost": self.cost_function(best_performer),
+            "cost": best_cost,
             "min": best_performer
         }
 
@@ -23,6 +23,9 @@ setup(
     install_requires=[
         "numpy",
         ],
+    extras_require={
+        "numba": ["numba"],
+        },
 )
 
 # test 
\ No newline at end of file
@@ -0,0 +1,35 @@
+import numpy as np
+
+from PyQEA import QuantumEvAlgorithm
+
+
+def batch_sphere(x: np.ndarray):
+    """Cost function that only accepts inputs of shape
+    (n_samples, n_dims)"""
+
+    return np.sum(np.square(x - 1), axis=1)
+
+
+n_dims = 5
+up = 5*np.ones(n_dims)
+low = -5*np.ones(n_dims)
+integrals = np.full(n_dims, False)
+
+results = []
+for ros_flag in (False, True):
+    optimizer = QuantumEvAlgorithm(batch_sphere, n_dims=n_dims,
+                                   upper_bound=up, lower_bound=low,
+                                   integral_id=integrals,
+                                   sigma_scaler=1.003,
+                                   mu_scaler=20, elitist_level=6,
+                                   ros_flag=ros_flag,
+                                   restrictions=[], seed=0)
+
+    results.append(optimizer.training(N_iterations=2000, sample_size=20,
+                                      save=False))
+
+
+def test_batch_only_training():
+
+    for result in results:
+        assert float(result['cost']) <= 1e-3
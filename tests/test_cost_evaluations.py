@@ -0,0 +1,46 @@
+import numpy as np
+
+from PyQEA import QuantumEvAlgorithm
+from PyQEA.utils.cost_functions import f
+
+
+class CountingCost:
+    """Wraps f, counting batch and single point evaluations"""
+
+    def __init__(self):
+        self.batch_calls = 0
+        self.point_calls = 0
+
+    def __call__(self, x):
+        if x.ndim == 1 or x.shape[0] == 1:
+            self.point_calls += 1
+        else:
+            self.batch_calls += 1
+        return f(x)
+
+
+n_dims = 10
+N_iterations = 100
+up = 5*np.ones(n_dims)
+low = -5*np.ones(n_dims)
+integrals = np.full(n_dims, False)
+
+cost = CountingCost()
+optimizer = QuantumEvAlgorithm(cost, n_dims=n_dims, upper_bound=up,
+                               lower_bound=low, integral_id=integrals,
+                               sigma_scaler=1.003,
+                               mu_scaler=20, elitist_level=6,
+                               restrictions=[], seed=0)
+# Discard the probe made by the constructor
+cost.batch_calls = 0
+
+optimizer.training(N_iterations=N_iterations, sample_size=20, save=False)
+
+
+def test_cost_evaluations():
+
+    # One batch per iteration
+    assert cost.batch_calls == N_iterations + 1
+    # The elite mean of every iteration but the last; nothing is
+    # evaluated in quantum_update (no ros_flag)
+    assert cost.point_calls == N_iterations
@@ -0,0 +1,36 @@
+import numpy as np
+
+from PyQEA import QuantumEvAlgorithm
+from PyQEA.utils.cost_functions import f
+
+n_dims = 10
+up = 5*np.ones(n_dims)
+low = -5*np.ones(n_dims)
+integrals = np.full(n_dims, False)
+
+optimizer = QuantumEvAlgorithm(f, n_dims=n_dims, upper_bound=up,
+                               lower_bound=low, integral_id=integrals,
+                               sigma_scaler=1.003,
+                               mu_scaler=20, elitist_level=6,
+                               restrictions=[], n_workers=2, seed=0)
+
+with optimizer:
+    optimizer.quantum_individual_init()
+    samples = optimizer.quantum_sampling(20)
+    serial_cost = f(samples)
+    parallel_cost = optimizer.evaluate(samples)
+    pool_in_block = optimizer._pool is not None
+
+pool_after_block = optimizer._pool
+
+results = optimizer.training(N_iterations=4000, sample_size=20, save=False)
+pool_after_training = optimizer._pool
+
+
+def test_parallel_training():
+
+    assert np.allclose(serial_cost, parallel_cost)
+    assert pool_in_block
+    assert pool_after_block is None
+    assert pool_after_training is None
+    assert float(results['cost']) <= 1
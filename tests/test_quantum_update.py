@@ -0,0 +1,31 @@
+import numpy as np
+
+from PyQEA.qea import _quantum_update_kernel, _quantum_update_numpy
+
+rng = np.random.default_rng(0)
+n_dims = 50
+mu = rng.uniform(-5, 5, n_dims)
+sigma = rng.uniform(0, 0.01, n_dims)
+best = mu + rng.normal(0, 0.01, n_dims)
+bob = rng.uniform(-5, 5, n_dims)
+# sigma_decider == 1 exactly
+mu[0], sigma[0], best[0] = 0.0, 0.5, 0.5
+# Pinned features (upper == lower), with and without a mu delta
+mu[1], sigma[1], best[1], bob[1] = 3.0, 0.0, 3.0, 3.0
+mu[2], sigma[2], best[2] = 3.0, 0.0, 3.5
+
+
+def test_quantum_update_kernels_agree():
+
+    for boost in (False, True):
+        mu_kernel, sigma_kernel = mu.copy(), sigma.copy()
+        mu_np, sigma_np = mu.copy(), sigma.copy()
+
+        _quantum_update_kernel(mu_kernel, sigma_kernel, best, bob, 20, 1.5,
+                               boost)
+        _quantum_update_numpy(mu_np, sigma_np, best, bob, 20, 1.5, boost)
+
+        assert np.allclose(mu_kernel, mu_np)
+        assert np.allclose(sigma_kernel, sigma_np)
+        assert np.all(sigma_kernel[[1, 2]] == 0)
+        assert np.all(np.delete(sigma_kernel, [1, 2]) > 0)
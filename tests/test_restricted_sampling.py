@@ -0,0 +1,32 @@
+import numpy as np
+
+from PyQEA import QuantumEvAlgorithm
+from PyQEA.utils.cost_functions import f
+
+
+def h1(x: np.ndarray):
+    return x[:, 0] + x[:, 1]
+
+
+def h2(x: np.ndarray):
+    return 1 - x[:, 0]
+
+
+n_dims = 4
+up = 5*np.ones(n_dims)
+low = -5*np.ones(n_dims)
+integrals = np.full(n_dims, False)
+
+optimizer = QuantumEvAlgorithm(f, n_dims=n_dims, upper_bound=up,
+                               lower_bound=low, integral_id=integrals,
+                               restrictions=[h1, h2], seed=0)
+
+optimizer.quantum_individual_init()
+samples = optimizer.restricted_quantum_sampling(500)
+
+
+def test_restricted_sampling():
+
+    assert samples.shape == (500, n_dims)
+    assert np.all(h1(samples) >= 0)
+    assert np.all(h2(samples) >= 0)
@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+
+from PyQEA import QuantumEvAlgorithm
+from PyQEA.utils.cost_functions import f
+
+
+def sphere(x: np.ndarray):
+    """Cost function written for a single point"""
+
+    return float(np.sum(np.square(x - 1.5)))
+
+
+def math_sphere(x):
+    """Single point cost function that fails on a batch"""
+
+    return math.fsum((v - 1.5) * (v - 1.5) for v in x)
+
+
+n_dims = 5
+up = 5*np.ones(n_dims)
+low = -5*np.ones(n_dims)
+integrals = np.full(n_dims, False)
+
+optimizer = QuantumEvAlgorithm(sphere, n_dims=n_dims, upper_bound=up,
+                               lower_bound=low, integral_id=integrals,
+                               sigma_scaler=1.003,
+                               mu_scaler=20, elitist_level=6,
+                               restrictions=[], seed=0)
+
+results = optimizer.training(N_iterations=2000, sample_size=20, save=False)
+
+math_optimizer = QuantumEvAlgorithm(math_sphere, n_dims=n_dims,
+                                    upper_bound=up, lower_bound=low,
+                                    integral_id=integrals,
+                                    sigma_scaler=1.003,
+                                    mu_scaler=20, elitist_level=6,
+                                    restrictions=[], seed=0)
+
+math_results = math_optimizer.training(N_iterations=2000, sample_size=20,
+                                       save=False)
+
+# Returns a size-1 array for a single point
+array_optimizer = QuantumEvAlgorithm(f, n_dims=n_dims, upper_bound=up,
+                                     lower_bound=low, integral_id=integrals,
+                                     sigma_scaler=1.003,
+                                     mu_scaler=20, elitist_level=6,
+                                     restrictions=[], seed=0,
+                                     vectorized=False)
+
+array_results = array_optimizer.training(N_iterations=2000, sample_size=20,
+                                         save=False)
+
+
+def test_scalar_training():
+
+    assert optimizer._scalar_cf
+    assert float(results['cost']) <= 1e-3
+
+
+def test_math_scalar_training():
+
+    assert math_optimizer._scalar_cf
+    assert float(math_results['cost']) <= 1e-3
+
+
+def test_array_scalar_training():
+
+    assert array_optimizer._scalar_cf
+    assert float(array_results['cost']) <= 1e-3
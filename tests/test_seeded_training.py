@@ -0,0 +1,27 @@
+import numpy as np
+
+from PyQEA import QuantumEvAlgorithm
+from PyQEA.utils.cost_functions import f
+
+n_dims = 10
+up = 5*np.ones(n_dims)
+low = -5*np.ones(n_dims)
+integrals = np.full(n_dims, False)
+integrals[0:3] = True
+
+results = []
+for _ in range(2):
+    optimizer = QuantumEvAlgorithm(f, n_dims=n_dims, upper_bound=up,
+                                   lower_bound=low, integral_id=integrals,
+                                   sigma_scaler=1.003,
+                                   mu_scaler=20, elitist_level=6,
+                                   restrictions=[], seed=1234)
+
+    results.append(optimizer.training(N_iterations=500, sample_size=20,
+                                      save=False))
+
+
+def test_seeded_training():
+
+    assert results[0]['cost'] == results[1]['cost']
+    assert np.array_equal(results[0]['min'], results[1]['min'])